@@ -86,12 +86,7 @@ class AccountMethods:
 
         if request.status_code == 200:
             raw_personas = request.json().get("personas", [])
-            personas = []
-
-            for raw_persona in raw_personas:
-                personas.append(Persona(raw_persona))
-
-            return personas
+            return [Persona(raw_persona) for raw_persona in raw_personas]
 
         raise FetchError("Cannot fetch your personas.")
 
@@ -103,12 +98,7 @@ class AccountMethods:
 
         if request.status_code == 200:
             raw_characters = request.json().get("characters", [])
-            characters = []
-
-            for raw_character in raw_characters:
-                characters.append(CharacterShort(raw_character))
-
-            return characters
+            return [CharacterShort(raw_character) for raw_character in raw_characters]
 
         raise FetchError("Cannot fetch your characters.")
 
@@ -120,12 +110,7 @@ class AccountMethods:
 
         if request.status_code == 200:
             characters_raw = request.json().get("characters", [])
-            characters = []
-
-            for character_raw in characters_raw:
-                characters.append(CharacterShort(character_raw))
-
-            return characters
+            return [CharacterShort(character_raw) for character_raw in characters_raw]
 
         raise FetchError("Cannot fetch your upvoted characters.")
 
@@ -138,13 +123,8 @@ class AccountMethods:
         response = request.json()
 
         if request.status_code == 200:
-            raw_voices = request.json().get("voices", [])
-            voices = []
-
-            for raw_voice in raw_voices:
-                voices.append(Voice(raw_voice))
-
-            return voices
+            raw_voices = response.get("voices", [])
+            return [Voice(raw_voice) for raw_voice in raw_voices]
 
         if response.get("command", "") == "neo_error":
             error_comment = response.get("comment", "")
@@ -262,7 +242,7 @@ class AccountMethods:
                         "definition": definition,
                         "description": "This is my persona.",
                         "greeting": "Hello! This is my persona",
-                        "identifier": f"id:{str(uuid.uuid4())}",
+                        "identifier": f"id:{uuid.uuid4()}",
                         "img_gen_enabled": False,
                         "name": name,
                         "strip_img_prompt_from_msg": False,
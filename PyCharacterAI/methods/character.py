@@ -1,8 +1,12 @@
+import time
 import uuid
 import json
+import asyncio
 
-from typing import Any, List, Dict, Optional
-from urllib.parse import quote
+from collections import OrderedDict
+
+from typing import Any, Awaitable, Callable, Hashable, Iterable, List, Dict, Optional, Union
+from urllib.parse import quote_from_bytes
 
 from ..types import Character, CharacterShort
 from ..exceptions import (
@@ -16,108 +20,258 @@ from ..exceptions import (
 
 from ..requester import Requester
 
+CHARACTER_INFO_CACHE_TTL = 300
+CHARACTERS_BY_CATEGORY_CACHE_TTL = 900
+
+_CHARACTERS_BY_CATEGORY_URL = "https://plus.character.ai/chat/curated_categories/characters/"
+_RECOMMENDED_CHARACTERS_URL = "https://neo.character.ai/recommendation/v1/user"
+_FEATURED_CHARACTERS_URL = "https://plus.character.ai/chat/characters/featured_v2/"
+_SIMILAR_CHARACTERS_URL = "https://neo.character.ai/recommendation/v1/character/"
+_CHARACTER_INFO_URL = "https://neo.character.ai/character/v1/get_character_info"
+_CHARACTER_VOTE_URL = "https://plus.character.ai/chat/character/vote/"
+_CREATE_CHARACTER_URL = "https://plus.character.ai/chat/character/create/"
+_EDIT_CHARACTER_URL = "https://plus.character.ai/chat/character/update/"
+_SEARCH_CHARACTERS_URL = "https://character.ai/api/trpc/search.search?batch=1&input="
+_SEARCH_CREATORS_URL = "https://character.ai/api/trpc/search.searchCreators?batch=1&input="
+
+
+def _build_search_url(base_url: str, query: str) -> str:
+    # escaped exactly like urllib.parse.quote(query)
+    payload = {"0": {"json": {"searchQuery": quote_from_bytes(query.encode("utf-8"), safe="/")}}}
+    return base_url + json.dumps(payload, separators=(",", ":"))
+
+
+_CHARACTER_VISIBILITIES = frozenset(("UNLISTED", "PUBLIC", "PRIVATE"))
+
+# (min, max) length; optional fields are only checked when not empty
+_CHARACTER_NAME_LENGTH = (3, 20)
+_CHARACTER_GREETING_LENGTH = (3, 4096)
+_CHARACTER_TITLE_LENGTH = (3, 50)
+_CHARACTER_DESCRIPTION_MAX_LENGTH = 500
+_CHARACTER_DEFINITION_MAX_LENGTH = 32000
+
+
+def _validate_character_fields(
+    action: str, name: str, greeting: str, title: str, description: str, definition: str, visibility: str
+) -> str:
+    # returns normalized (upper case) visibility
+    min_length, max_length = _CHARACTER_NAME_LENGTH
+    if not min_length <= len(name) <= max_length:
+        raise InvalidArgumentError(
+            f"Cannot {action} character. Name must be at least {min_length} characters and no more than {max_length}."
+        )
+
+    min_length, max_length = _CHARACTER_GREETING_LENGTH
+    if not min_length <= len(greeting) <= max_length:
+        raise InvalidArgumentError(
+            f"Cannot {action} character. Greeting must be at least {min_length} characters and no more than {max_length}."
+        )
+
+    visibility = visibility.upper()
+    if visibility not in _CHARACTER_VISIBILITIES:
+        raise InvalidArgumentError(f'Cannot {action} character. Visibility must be "unlisted", "public" or "private"')
+
+    min_length, max_length = _CHARACTER_TITLE_LENGTH
+    if title and not min_length <= len(title) <= max_length:
+        raise InvalidArgumentError(
+            f"Cannot {action} character. Title must be at least {min_length} characters and no more than {max_length}."
+        )
+
+    if description and len(description) > _CHARACTER_DESCRIPTION_MAX_LENGTH:
+        raise InvalidArgumentError(
+            f"Cannot {action} character. Description must be no more than {_CHARACTER_DESCRIPTION_MAX_LENGTH} characters."
+        )
+
+    if definition and len(definition) > _CHARACTER_DEFINITION_MAX_LENGTH:
+        raise InvalidArgumentError(
+            f"Cannot {action} character. Definition must be no more than {_CHARACTER_DEFINITION_MAX_LENGTH} characters."
+        )
+
+    return visibility
+
+
+# fields the web client always sends with the same values on create and edit
+_CHARACTER_PAYLOAD_DEFAULTS: Dict[str, Any] = {
+    "base_img_prompt": "",
+    "categories": (),  # serialized as an empty list, a tuple can't be mutated by accident
+    "img_gen_enabled": False,
+    "strip_img_prompt_from_msg": False,
+    "voice_id": "",
+}
+
+
+def _character_payload(
+    name: str,
+    greeting: str,
+    title: str,
+    description: str,
+    definition: str,
+    copyable: bool,
+    visibility: str,
+    avatar_rel_path: str,
+    default_voice_id: str,
+    **extra_fields: Any,
+) -> Dict[str, Any]:
+    return {
+        **_CHARACTER_PAYLOAD_DEFAULTS,
+        "avatar_rel_path": avatar_rel_path,
+        "copyable": copyable,
+        "default_voice_id": default_voice_id,
+        "definition": definition,
+        "description": description,
+        "greeting": greeting,
+        "name": name,
+        "title": title,
+        "visibility": visibility,
+        **extra_fields,
+    }
+
+
+class _TTLCache:
+    # small LRU cache whose entries expire after `ttl` seconds
+    def __init__(self, maxsize: int, ttl: float):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self.__entries.get(key, None)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.__entries[key]
+            return None
+
+        self.__entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.__entries[key] = (time.monotonic() + self.__ttl, value)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__maxsize:
+            self.__entries.popitem(last=False)
+
+    def discard(self, condition: Callable[[Any], bool]) -> None:
+        for key in [key for key in self.__entries if condition(key)]:
+            del self.__entries[key]
+
 
 class CharacterMethods:
     def __init__(self, client, requester: Requester):
         self.__client = client
         self.__requester = requester
 
-    async def fetch_characters_by_category(self, **kwargs: Any) -> Dict[str, List[CharacterShort]]:
-        request = await self.__requester.request_async(
-            url="https://plus.character.ai/chat/curated_categories/characters/",
-            options={"headers": self.__client.get_headers(kwargs.get("token", None))},
-        )
+        # undecoded response bodies (bytes), keyed by (character_id, token) and (token,) respectively.
+        # they are decoded on every hit, so returned objects never share mutable state with the cache
+        self.__character_info_cache = _TTLCache(maxsize=4096, ttl=CHARACTER_INFO_CACHE_TTL)
+        self.__characters_by_category_cache = _TTLCache(maxsize=16, ttl=CHARACTERS_BY_CATEGORY_CACHE_TTL)
 
-        if request.status_code == 200:
-            characters_by_category = {}
-            raw = request.json().get("characters_by_curated_category", {})
+    async def __gather_limited(
+        self,
+        func: Callable[[str], Awaitable[Any]],
+        character_ids: Iterable[str],
+        max_concurrency: Optional[int],
+    ) -> List[Any]:
+        # by default as many requests as the requester's connection pool can serve at once
+        if max_concurrency is None:
+            max_concurrency = self.__requester.get_max_clients()
 
-            for category in raw.keys():
-                characters_raw = raw.get(category)
-                characters = []
+        if max_concurrency < 1:
+            raise InvalidArgumentError("Cannot fetch characters. max_concurrency must be at least 1.")
 
-                for character_raw in characters_raw:
-                    characters.append(CharacterShort(character_raw))
+        semaphore = asyncio.Semaphore(max_concurrency)
 
-                characters_by_category[category] = characters
+        async def run(character_id: str) -> Any:
+            async with semaphore:
+                return await func(character_id)
 
-            return characters_by_category
+        return await asyncio.gather(*[run(character_id) for character_id in character_ids], return_exceptions=True)
 
-        raise FetchError("Cannot fetch characters by category.")
+    def __invalidate_character(self, character_id: str) -> None:
+        self.__character_info_cache.discard(lambda key: key[0] == character_id)
 
-    async def fetch_recommended_characters(self, **kwargs: Any) -> List[CharacterShort]:
-        request = await self.__requester.request_async(
-            url="https://neo.character.ai/recommendation/v1/user",
-            options={"headers": self.__client.get_headers(kwargs.get("token", None))},
-        )
-        
-        response = request.json()
+    async def fetch_characters_by_category(self, **kwargs: Any) -> Dict[str, List[CharacterShort]]:
+        token = kwargs.get("token", None)
+        cache_key = (token or self.__client.get_token(),)
+        use_cache = kwargs.get("use_cache", True)
 
-        if request.status_code == 200:
-            characters_raw = response.get("characters", [])
-            characters = []
+        content: Optional[bytes] = self.__characters_by_category_cache.get(cache_key) if use_cache else None
 
-            for character_raw in characters_raw:
-                characters.append(CharacterShort(character_raw))
+        if content is None:
+            request = await self.__requester.request_async(
+                url=_CHARACTERS_BY_CATEGORY_URL,
+                options={"headers": self.__client.get_headers(token)},
+            )
 
-            return characters
+            if request.status_code != 200:
+                raise FetchError("Cannot fetch characters by category.")
 
-        if response.get("command", "") == "neo_error":
-            error_comment = response.get("comment", "")
-            raise FetchError(f"Cannot fetch recommended characters. {error_comment}")
-        raise FetchError("Cannot fetch recommended characters.")
+            content = request.content
+            self.__characters_by_category_cache.set(cache_key, content)
 
-    async def fetch_featured_characters(self, **kwargs: Any) -> List[CharacterShort]:
+        raw = json.loads(content).get("characters_by_curated_category", {})
+
+        return {
+            category: [CharacterShort(character_raw) for character_raw in characters_raw]
+            for category, characters_raw in raw.items()
+        }
+
+    async def __fetch_characters(self, url: str, action: str, token: Optional[str]) -> List[CharacterShort]:
         request = await self.__requester.request_async(
-            url="https://plus.character.ai/chat/characters/featured_v2/",
-            options={"headers": self.__client.get_headers(kwargs.get("token", None))},
+            url=url,
+            options={"headers": self.__client.get_headers(token)},
         )
-        
+
         response = request.json()
 
         if request.status_code == 200:
-            characters_raw = response.get("characters", [])
-            characters = []
-
-            for character_raw in characters_raw:
-                characters.append(CharacterShort(character_raw))
-
-            return characters
+            return [CharacterShort(character_raw) for character_raw in response.get("characters", [])]
 
         if response.get("command", "") == "neo_error":
             error_comment = response.get("comment", "")
-            raise FetchError(f"Cannot fetch featured characters. {error_comment}")
-        raise FetchError("Cannot fetch featured characters.")
+            raise FetchError(f"Cannot fetch {action}. {error_comment}")
+        raise FetchError(f"Cannot fetch {action}.")
 
-    async def fetch_similar_characters(self, character_id: str, **kwargs: Any) -> List[CharacterShort]:
-        request = await self.__requester.request_async(
-            url=f"https://neo.character.ai/recommendation/v1/character/{character_id}",
-            options={"headers": self.__client.get_headers(kwargs.get("token", None))},
+    async def fetch_recommended_characters(self, **kwargs: Any) -> List[CharacterShort]:
+        return await self.__fetch_characters(
+            _RECOMMENDED_CHARACTERS_URL, "recommended characters", kwargs.get("token", None)
         )
-        
-        response = request.json()
 
-        if request.status_code == 200:
-            characters_raw = response.get("characters", [])
-            characters = []
-
-            for character_raw in characters_raw:
-                characters.append(CharacterShort(character_raw))
+    async def fetch_featured_characters(self, **kwargs: Any) -> List[CharacterShort]:
+        return await self.__fetch_characters(_FEATURED_CHARACTERS_URL, "featured characters", kwargs.get("token", None))
 
-            return characters
+    async def fetch_similar_characters(self, character_id: str, **kwargs: Any) -> List[CharacterShort]:
+        return await self.__fetch_characters(
+            _SIMILAR_CHARACTERS_URL + character_id, "similar characters", kwargs.get("token", None)
+        )
 
-        if response.get("command", "") == "neo_error":
-            error_comment = response.get("comment", "")
-            raise FetchError(f"Cannot fetch similar characters. {error_comment}")
-        raise FetchError("Cannot fetch similar characters.")
+    async def fetch_similar_characters_batched(
+        self, character_ids: Iterable[str], max_concurrency: Optional[int] = None, **kwargs: Any
+    ) -> List[Union[List[CharacterShort], Exception]]:
+        return await self.__gather_limited(
+            lambda character_id: self.fetch_similar_characters(character_id, **kwargs), character_ids, max_concurrency
+        )
 
     async def fetch_character_info(self, character_id: str, **kwargs: Any) -> Character:
+        token = kwargs.get("token", None)
+        cache_key = (character_id, token or self.__client.get_token())
+
+        if kwargs.get("use_cache", True):
+            content: Optional[bytes] = self.__character_info_cache.get(cache_key)
+            if content is not None:
+                return Character(json.loads(content)["character"])
+
         request = await self.__requester.request_async(
-            url="https://neo.character.ai/character/v1/get_character_info",
+            url=_CHARACTER_INFO_URL,
             options={
                 "method": "POST",
-                "headers": self.__client.get_headers(kwargs.get("token", None)),
+                "headers": self.__client.get_headers(token),
                 "body": json.dumps({"external_id": character_id}),
+                # read-only despite being a POST, so it is safe to retry
+                "retry": True,
             },
         )
 
@@ -127,23 +281,22 @@ class CharacterMethods:
                 error = response.get("error", "")
                 raise FetchError(f"Cannot fetch character information. {error}")
 
+            self.__character_info_cache.set(cache_key, request.content)
             return Character(response["character"])
 
         raise FetchError("Cannot fetch character information.")
 
+    async def fetch_character_infos(
+        self, character_ids: Iterable[str], max_concurrency: Optional[int] = None, **kwargs: Any
+    ) -> List[Union[Character, Exception]]:
+        return await self.__gather_limited(
+            lambda character_id: self.fetch_character_info(character_id, **kwargs), character_ids, max_concurrency
+        )
+
     async def search_characters(self, character_name: str, **kwargs: Any) -> List[CharacterShort]:
-        payload = {
-            "0": {
-                "json": {
-                    "searchQuery": quote(character_name)
-                }
-            }
-        }
-        
         web_next_auth = kwargs.get("web_next_auth", None)
         request = await self.__requester.request_async(
-            url=f"https://character.ai/api/trpc/search.search?batch=1"
-                f"&input={json.dumps(payload, separators=(',', ':'))}",
+            url=_build_search_url(_SEARCH_CHARACTERS_URL, character_name),
             options={"cookies": {"web-next-auth": web_next_auth} if web_next_auth else {}}
         )
         
@@ -153,18 +306,18 @@ class CharacterMethods:
 
         raise SearchError("Cannot search for characters.")
 
-    async def search_creators(self, creator_name: str, **kwargs: Any) -> List[str]:
-        payload = {
-            '0': {
-                'json': {
-                    'searchQuery': quote(creator_name)
-                }
-            }
-        }
+    async def search_and_fetch_characters(
+        self, character_name: str, max_concurrency: Optional[int] = None, **kwargs: Any
+    ) -> List[Union[Character, Exception]]:
+        characters = await self.search_characters(character_name, **kwargs)
 
+        return await self.fetch_character_infos(
+            [character.character_id for character in characters], max_concurrency, **kwargs
+        )
+
+    async def search_creators(self, creator_name: str, **kwargs: Any) -> List[str]:
         request = await self.__requester.request_async(
-            url=f"https://character.ai/api/trpc/search.searchCreators?batch=1"
-                f"&input={json.dumps(payload, separators=(',', ':'))}",
+            url=_build_search_url(_SEARCH_CREATORS_URL, creator_name),
             options={"headers": self.__client.get_headers(authorization=False)},
         )
 
@@ -176,7 +329,7 @@ class CharacterMethods:
 
     async def character_vote(self, character_id: str, vote: Optional[bool], **kwargs: Any) -> bool:
         request = await self.__requester.request_async(
-            url="https://plus.character.ai/chat/character/vote/",
+            url=_CHARACTER_VOTE_URL,
             options={
                 "method": "POST",
                 "headers": self.__client.get_headers(kwargs.get("token", None)),
@@ -185,7 +338,11 @@ class CharacterMethods:
         )
 
         if request.status_code == 200:
-            return (request.json()).get("status", None) == "OK"
+            voted = (request.json()).get("status", None) == "OK"
+            if voted:
+                self.__invalidate_character(character_id)
+
+            return voted
 
         raise ActionError("Cannot vote for character.")
 
@@ -202,54 +359,26 @@ class CharacterMethods:
         default_voice_id: str = "",
         **kwargs: Any,
     ) -> Character:
-        if len(name) < 3 or len(name) > 20:
-            raise InvalidArgumentError(
-                "Cannot create character. Name must be at least 3 characters and no more than 20."
-            )
-
-        if len(greeting) < 3 or len(greeting) > 4096:
-            raise InvalidArgumentError(
-                "Cannot create character. Greeting must be at least 3 characters and no more than 4096."
-            )
-
-        visibility = visibility.upper()
-        if visibility not in ["UNLISTED", "PUBLIC", "PRIVATE"]:
-            raise InvalidArgumentError('Cannot create character. Visibility must be "unlisted", "public" or "private"')
-
-        if title and (len(title) < 3 or len(title) > 50):
-            raise InvalidArgumentError(
-                "Cannot create character. Title must be at least 3 characters and no more than 50."
-            )
-
-        if description and len(description) > 500:
-            raise InvalidArgumentError("Cannot create character. Description must be no more than 500 characters.")
-
-        if definition and len(definition) > 32000:
-            raise InvalidArgumentError("Cannot create character. Definition must be no more than 32000 characters.")
+        visibility = _validate_character_fields("create", name, greeting, title, description, definition, visibility)
 
         request = await self.__requester.request_async(
-            url="https://plus.character.ai/chat/character/create/",
+            url=_CREATE_CHARACTER_URL,
             options={
                 "method": "POST",
                 "headers": self.__client.get_headers(kwargs.get("token", None)),
                 "body": json.dumps(
-                    {
-                        "avatar_rel_path": avatar_rel_path,
-                        "base_img_prompt": "",
-                        "categories": [],
-                        "copyable": copyable,
-                        "default_voice_id": default_voice_id,
-                        "definition": definition,
-                        "description": description,
-                        "greeting": greeting,
-                        "identifier": f"id:{str(uuid.uuid4())}",
-                        "img_gen_enabled": False,
-                        "name": name,
-                        "strip_img_prompt_from_msg": False,
-                        "title": title,
-                        "visibility": visibility,
-                        "voice_id": "",
-                    }
+                    _character_payload(
+                        name,
+                        greeting,
+                        title,
+                        description,
+                        definition,
+                        copyable,
+                        visibility,
+                        avatar_rel_path,
+                        default_voice_id,
+                        identifier=f"id:{uuid.uuid4()}",
+                    )
                 ),
             },
         )
@@ -277,53 +406,27 @@ class CharacterMethods:
         default_voice_id: str = "",
         **kwargs: Any,
     ) -> Character:
-        if len(name) < 3 or len(name) > 20:
-            raise InvalidArgumentError("Cannot edit character. Name must be at least 3 characters and no more than 20.")
-
-        if len(greeting) < 3 or len(greeting) > 4096:
-            raise InvalidArgumentError(
-                "Cannot edit character. Greeting must be at least 3 characters and no more than 4096."
-            )
-
-        visibility = visibility.upper()
-        if visibility not in ["UNLISTED", "PUBLIC", "PRIVATE"]:
-            raise InvalidArgumentError('Cannot edit character. Visibility must be "unlisted", "public" or "private"')
-
-        if title and (len(title) < 3 or len(title) > 50):
-            raise InvalidArgumentError(
-                "Cannot edit character. Title must be at least 3 characters and no more than 50."
-            )
-
-        if description and len(description) > 500:
-            raise InvalidArgumentError("Cannot edit character. Description must be no more than 500 characters.")
-
-        if definition and len(definition) > 32000:
-            raise InvalidArgumentError("Cannot edit character. Definition must be no more than 32000 characters.")
+        visibility = _validate_character_fields("edit", name, greeting, title, description, definition, visibility)
 
         request = await self.__requester.request_async(
-            url="https://plus.character.ai/chat/character/update/",
+            url=_EDIT_CHARACTER_URL,
             options={
                 "method": "POST",
                 "headers": self.__client.get_headers(kwargs.get("token", None)),
                 "body": json.dumps(
-                    {
-                        "archived": False,
-                        "avatar_rel_path": avatar_rel_path,
-                        "base_img_prompt": "",
-                        "categories": [],
-                        "copyable": copyable,
-                        "default_voice_id": default_voice_id,
-                        "definition": definition,
-                        "description": description,
-                        "external_id": character_id,
-                        "greeting": greeting,
-                        "img_gen_enabled": False,
-                        "name": name,
-                        "strip_img_prompt_from_msg": False,
-                        "title": title,
-                        "visibility": visibility,
-                        "voice_id": "",
-                    }
+                    _character_payload(
+                        name,
+                        greeting,
+                        title,
+                        description,
+                        definition,
+                        copyable,
+                        visibility,
+                        avatar_rel_path,
+                        default_voice_id,
+                        archived=False,
+                        external_id=character_id,
+                    )
                 ),
             },
         )
@@ -331,6 +434,7 @@ class CharacterMethods:
         if request.status_code == 200:
             response = request.json()
             if response.get("status", None) == "OK" and response.get("character", None) is not None:
+                self.__invalidate_character(character_id)
                 return Character(response.get("character"))
 
             raise EditError(f"Cannot edit character. {response.get('error', '')}")
@@ -40,11 +40,7 @@ class UserMethods:
 
         if request.status_code == 200:
             raw_voices = response.get("voices", [])
-            voices = []
-
-            for raw_voice in raw_voices:
-                voices.append(Voice(raw_voice))
-            return voices
+            return [Voice(raw_voice) for raw_voice in raw_voices]
 
         if response.get("command", "") == "neo_error":
             error_comment = response.get("comment", "")
@@ -3,7 +3,8 @@ import json
 import base64
 import mimetypes
 
-from random import randint
+from random import choices
+from string import digits
 from typing import Any, List, Optional, Union
 from urllib.parse import urlparse, quote
 
@@ -174,7 +175,7 @@ class UtilsMethods:
                 raise InvalidArgumentError("Cannot upload voice. Invalid audio.")
 
         # sequence of 30 random numbers
-        boundary_numbers = "".join(["{}".format(randint(0, 9)) for _ in range(0, 30)])
+        boundary_numbers = "".join(choices(digits, k=30))
 
         boundary = f"---------------------------{boundary_numbers}"
 
@@ -1,13 +1,27 @@
 import asyncio
 import json
+import random
 
-from typing import Dict, AsyncGenerator, List, Optional, Tuple
+from collections import deque
+from typing import Any, Deque, Dict, AsyncGenerator, List, Optional, Tuple
 
 # for requests
 import curl_cffi
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError, Timeout as CurlTimeout
 
 from .exceptions import RequestError, AuthenticationError, WebsocketClosedError, WebsocketError
 
+# size of the session's connection pool (curl_cffi defaults to 10)
+DEFAULT_MAX_CLIENTS = 64
+
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+RETRY_MAX_DELAY = 30.0
+
+# requests with these methods may have taken effect even if the response was lost,
+# so by default they are only retried when the server explicitly rate-limited them (429).
+# read-only requests sent with these methods can opt in to full retries with options["retry"]
+NON_IDEMPOTENT_METHODS = ("POST", "PATCH")
+
 
 class Requester:
     def __init__(self, **kwargs):
@@ -16,16 +30,20 @@ class Requester:
         self.__websocket_headers: Optional[Dict[str, str]] = self.__extra_options.pop("websocket_headers", None)
         self.__websocket_default_headers: bool = self.__extra_options.pop("websocket_default_headers", True)
 
-        self.__impersonate: Optional[curl_cffi.BrowserTypeLiteral] = self.__extra_options.pop("impersonate", None)
+        self.__impersonate: curl_cffi.BrowserTypeLiteral = self.__extra_options.pop("impersonate", None) or "firefox135"
         self.__proxy: Optional[str] = self.__extra_options.pop("proxy", None)
 
+        self.__extra_options.setdefault("max_clients", DEFAULT_MAX_CLIENTS)
+
+        self.__max_retries: int = self.__extra_options.pop("max_retries", 3)
+
         # debug information (TO-DO)
         # self.__debug: bool = self.__extra_options.pop("requester_debug", False)
         
         self.__requester_session: Optional[curl_cffi.AsyncSession] = None
         self.__ws: Optional[curl_cffi.AsyncWebSocket] = None
 
-        self.__ws_response_messages: Dict[str, List] = {}
+        self.__ws_response_messages: Dict[str, Deque] = {}
 
     # ================================================================== #
     #                              Requests                              #
@@ -46,12 +64,23 @@ class Requester:
             self.text: str = text
             self.content: bytes = content
 
-        def json(self):
-            return json.loads(self.text)
+            self.__json: Any = None
+            self.__json_parsed: bool = False
+
+        def json(self) -> Any:
+            # decoded once from the raw bytes, repeated calls return the same object
+            if not self.__json_parsed:
+                self.__json = json.loads(self.content)
+                self.__json_parsed = True
+
+            return self.__json
     
+    def get_max_clients(self) -> int:
+        return self.__extra_options["max_clients"]
+
     async def open_session(self) -> None: 
         self.__requester_session = curl_cffi.AsyncSession(
-            impersonate=self.__impersonate or "firefox135",
+            impersonate=self.__impersonate,
             proxy=self.__proxy, 
             **self.__extra_options
         )
@@ -68,36 +97,66 @@ class Requester:
         if not self.__requester_session:
             await self.open_session()
 
+    @staticmethod
+    def __retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(RETRY_MAX_DELAY, float(retry_after))
+
+        # exponential backoff with jitter
+        return min(RETRY_MAX_DELAY, 2**attempt + random.random())
+
     async def request_async(self, url: str, options=None) -> Response:
         if options is None:
             options = {}
 
         method = options.get("method", "GET")
+        retry: bool = options.get("retry", method not in NON_IDEMPOTENT_METHODS)
         headers = options.get("headers", {})
         cookies = options.get("cookies", {})
         body = options.get("body", {})
 
-        raw_response: Optional[curl_cffi.Response] = None
-
         await self.ensure_session()
         if not self.__requester_session:
             raise RequestError
 
-        if method == "GET":
-            raw_response = await self.__requester_session.get(url, headers=headers, cookies=cookies)
-
-        elif method == "POST":
-            raw_response = await self.__requester_session.post(url, headers=headers, data=body, cookies=cookies)
-
-        elif method == "PUT":
-            raw_response = await self.__requester_session.put(url, headers=headers, data=body, cookies=cookies)
+        raw_response: Optional[curl_cffi.Response] = None
+        attempt = 0
 
-        elif method == "PATCH":
-            raw_response = await self.__requester_session.patch(url, headers=headers, data=body, cookies=cookies)
+        while True:
+            try:
+                # every method goes through the same pooled session, so connections are reused across calls
+                raw_response = await self.__requester_session.request(
+                    method,
+                    url,
+                    headers=headers,
+                    data=body if method in ("POST", "PUT", "PATCH") else None,
+                    cookies=cookies,
+                )
+
+            # only network failures and timeouts can succeed on a retry
+            except (CurlConnectionError, CurlTimeout) as error:
+                if attempt >= self.__max_retries or not retry:
+                    raise RequestError(f"Request to {url} failed. {error}") from error
+
+                delay = self.__retry_delay(attempt)
+
+            except curl_cffi.CurlError as error:
+                raise RequestError(f"Request to {url} failed. {error}") from error
+
+            else:
+                status_code = raw_response.status_code
+
+                if (
+                    status_code not in RETRY_STATUS_CODES
+                    or attempt >= self.__max_retries
+                    or (status_code != 429 and not retry)
+                ):
+                    break
 
-        elif method == "DELETE":
-            raw_response = await self.__requester_session.delete(url, headers=headers, cookies=cookies)
+                delay = self.__retry_delay(attempt, raw_response.headers.get("retry-after", None))
 
+            attempt += 1
+            await asyncio.sleep(delay)
 
         if not raw_response:
             raise RequestError
@@ -141,7 +200,7 @@ class Requester:
         
         try:
             self.__ws = await self.__requester_session.ws_connect(
-                impersonate="firefox135" or self.__impersonate,
+                impersonate=self.__impersonate,
                 url="wss://neo.character.ai/ws/",
                 headers=self.__websocket_headers,
                 default_headers=self.__websocket_default_headers,
@@ -182,13 +241,10 @@ class Requester:
         try:
             while True:
                 if request_uuid is not None:
-                    saved_messages = self.__ws_response_messages.get(request_uuid, [])
+                    saved_messages = self.__ws_response_messages.get(request_uuid, None)
 
-                    if len(saved_messages) > 0:
-                        message = saved_messages.pop(0)
-                        self.__ws_response_messages[request_uuid] = saved_messages
-
-                        yield message
+                    if saved_messages:
+                        yield saved_messages.popleft()
                         continue
 
                 # else
@@ -215,10 +271,7 @@ class Requester:
                     yield response_json
                     break
 
-                messages = self.__ws_response_messages.get(request_uuid, [])
-                messages.append(response_json)
-
-                self.__ws_response_messages[request_uuid] = messages
+                self.__ws_response_messages.setdefault(request_uuid, deque()).append(response_json)
 
         finally:
             if request_uuid:
@@ -47,12 +47,8 @@ class PublicUser(BaseCAI):
         self.num_following = options.get("num_following", 0)
         self.num_followers = options.get("num_followers", 0)
 
-        self.characters: List[CharacterShort] = []
-
         raw_characters = options.get("characters", [])
-        if raw_characters != []:
-            for raw_character in raw_characters:
-                self.characters.append(CharacterShort(raw_character))
+        self.characters: List[CharacterShort] = [CharacterShort(raw_character) for raw_character in raw_characters]
 
         self.subscription_type = options.get("subscription_type", "NONE")
 